@@ -21,18 +21,21 @@ def main():
 
     groups = defaultdict(list)
 
-    # Collect and group pages
-    for f in input_dir.iterdir():
-        if not f.name.lower().endswith(".txt"):
-            continue
-
-        m = PAGE_RE.match(f.name)
-        if not m:
-            continue
-
-        base = m.group(1)
-        page = int(m.group(2))
-        groups[base].append((page, f))
+    # Collect and group pages; check the extension before paying for the
+    # regex, and bind the match method locally for the tight loop
+    page_re_match = PAGE_RE.match
+    with os.scandir(input_dir) as it:
+        for e in it:
+            if not e.name.lower().endswith(".txt"):
+                continue
+
+            m = page_re_match(e.name)
+            if not m:
+                continue
+
+            base = m.group(1)
+            page = int(m.group(2))
+            groups[base].append((page, Path(e.path)))
 
     # Combine each group
     for base, items in groups.items():
@@ -42,10 +45,12 @@ def main():
         out_path = output_dir / f"{base}.txt"
         print(f"Writing {out_path}")
 
-        with out_path.open("w", encoding="utf-8") as out:
+        # The pages are UTF-8 in and UTF-8 out, so copy bytes straight
+        # through instead of decoding and re-encoding every file
+        with out_path.open("wb") as out:
             for page_num, path in items:
-                text = path.read_text(encoding="utf-8", errors="replace")
-                out.write(text.rstrip("\n") + "\n\n")   # keep spacing
+                data = path.read_bytes()
+                out.write(data.rstrip(b"\n") + b"\n\n")   # keep spacing
 
     print("Done. Combined files are in:", output_dir)
 
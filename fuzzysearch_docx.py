@@ -1,22 +1,49 @@
 import argparse
 import csv
+import html
+import multiprocessing
 import os
 import re
 import sys
-from docx import Document
-from fuzzysearch import find_near_matches
-import Levenshtein
+import zipfile
+from functools import partial
+from rapidfuzz.distance import Levenshtein
+from rapidfuzz.fuzz import partial_ratio_alignment
 
 # --- Helper Functions ---
 
+# Deletion table for the not-sign used as a soft hyphen
+_NORM_TRANS = str.maketrans('', '', '¬')
+_WS_RE = re.compile(r'\s+')
+
+# Text runs inside word/document.xml; we only need their contents, not the
+# style/numbering machinery python-docx builds around them
+_T_RE = re.compile(r'<w:t[^>]*>([^<]*)</w:t>')
+# Soft line breaks, carriage returns and tabs separate words (para.text
+# emitted \n / \t for them); rewrite them as whitespace runs so the words
+# around them don't concatenate
+_BR_RE = re.compile(r'<w:(?:br|cr|tab)\b[^>]*/>')
+# doc.paragraphs only covered body paragraphs, so drop table and textbox
+# content to keep the extracted reference the same
+_SKIP_RE = re.compile(r'<w:tbl>.*?</w:tbl>|<w:txbxContent>.*?</w:txbxContent>',
+                      re.DOTALL)
+
 def read_docx_text(path):
     """Extracts all text from a docx file into a single string."""
     try:
-        doc = Document(path)
+        with zipfile.ZipFile(path) as z:
+            xml = z.read('word/document.xml').decode('utf-8')
+
+        xml = _SKIP_RE.sub(' ', xml)
+        xml = _BR_RE.sub('<w:t> </w:t>', xml)
+
+        # Runs within a paragraph concatenate directly (a word can span
+        # several runs); paragraphs are joined with a space as before
         full_text = []
-        for para in doc.paragraphs:
-            if para.text.strip():
-                full_text.append(para.text)
+        for para_xml in xml.split('</w:p>'):
+            text = ''.join(_T_RE.findall(para_xml))
+            if text.strip():
+                full_text.append(html.unescape(text))
         return " ".join(full_text)
     except Exception as e:
         print(f"Error reading DOCX {path}: {e}")
@@ -33,29 +60,45 @@ def read_htr_lines(path):
 
 def normalize_text(text):
     """Normalizes text: lower, remove hyphens, collapse spaces."""
-    text = text.lower()
-    text = text.replace('-\n', '').replace('- ', '').replace('¬', '')
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    text = text.lower().replace('-\n', '').replace('- ', '').translate(_NORM_TRANS)
+    return _WS_RE.sub(' ', text).strip()
 
 # --- Alignment Logic ---
 
-def align_lines(htr_lines, ref_full_text, window_buffer):
+def prepare_htr_lines(htr_lines):
     """
-    Runs the alignment for a specific window buffer size.
-    Returns a list of dictionaries containing match details for every HTR line.
+    Normalizes HTR lines once, keeping original line numbers and raw text.
+    Returns a list of (line_idx, raw_line, norm_line) tuples.
     """
-    norm_ref = normalize_text(ref_full_text)
-    cursor = 0
-    results = []
-
+    prepared = []
     for line_idx, raw_htr_line in enumerate(htr_lines):
+        # Normalization only ever shortens a line, so anything under 4 raw
+        # chars is noise — skip it before paying for the regex work
+        if len(raw_htr_line) < 4:
+            continue
+
         norm_htr = normalize_text(raw_htr_line)
-        
+
         # Skip noise
         if len(norm_htr) < 4:
             continue
 
+        prepared.append((line_idx, raw_htr_line, norm_htr))
+    return prepared
+
+def align_lines_prenorm(norm_htr_lines, norm_ref, window_buffer):
+    """
+    Runs the alignment for a specific window buffer size.
+    Takes pre-normalized input so the tournament doesn't re-normalize.
+    Returns one (abs_start, abs_end, edits) tuple per HTR line, with
+    (-1, -1, 0) marking NO_MATCH. The driver stays on plain integers so
+    the tournament never pays for per-line dicts; the winner's rows are
+    materialized afterwards by build_match_rows.
+    """
+    cursor = 0
+    spans = []
+
+    for _line_idx, _raw_htr_line, norm_htr in norm_htr_lines:
         # Dynamic Window calculation
         window_size = len(norm_htr) + window_buffer
         end_search = min(cursor + window_size, len(norm_ref))
@@ -65,19 +108,42 @@ def align_lines(htr_lines, ref_full_text, window_buffer):
         #max_dist = int(len(norm_htr) * 0.35)
         max_dist = int(len(norm_htr) * 0.2)
 
-        matches = find_near_matches(norm_htr, search_window, max_l_dist=max_dist)
+        # Bit-parallel matcher: returns the best-scoring substring alignment
+        # or None if nothing clears the 80% similarity cutoff (~20% errors).
+        alignment = partial_ratio_alignment(norm_htr, search_window,
+                                            score_cutoff=(1 - 0.2) * 100)
+
+        if alignment is not None:
+            abs_start = cursor + alignment.dest_start
+            abs_end = cursor + alignment.dest_end
+
+            # The matcher accepts on its own similarity ratio, which can
+            # clear 80 even when the edit distance blows the budget (e.g. a
+            # truncated window at the end of the reference that matches only
+            # a prefix of the line). Re-check against max_dist like the
+            # original fuzzysearch call did; score_cutoff clamps the result
+            # at max_dist + 1, so the comparison below still works.
+            edits = Levenshtein.distance(norm_htr, norm_ref[abs_start:abs_end],
+                                         score_cutoff=max_dist)
+            if edits <= max_dist:
+                spans.append((abs_start, abs_end, edits))
+                cursor = abs_end
+                continue
 
-        if matches:
-            # Best match logic
-            best_match = sorted(matches, key=lambda m: (m.dist, m.start))[0]
-            
-            abs_start = cursor + best_match.start
-            abs_end = cursor + best_match.end
-            
+        # No candidate within the edit budget; the cursor stays put
+        spans.append((-1, -1, 0))
+
+    return spans
+
+def build_match_rows(norm_htr_lines, norm_ref, spans, window_buffer):
+    """Materializes the per-line result dicts for one alignment run."""
+    results = []
+    for (line_idx, raw_htr_line, _norm_htr), (abs_start, abs_end, edits) in \
+            zip(norm_htr_lines, spans):
+        if abs_start >= 0:
             matched_ref_str = norm_ref[abs_start:abs_end]
-            
+
             # Calculate Local CER for this line
-            edits = best_match.dist
             ref_len = len(matched_ref_str)
             local_cer = edits / ref_len if ref_len > 0 else 1.0
 
@@ -91,8 +157,6 @@ def align_lines(htr_lines, ref_full_text, window_buffer):
                 "local_cer": local_cer,
                 "window_used": window_buffer
             })
-
-            cursor = abs_end
         else:
             results.append({
                 "line_idx": line_idx + 1,
@@ -107,14 +171,17 @@ def align_lines(htr_lines, ref_full_text, window_buffer):
 
     return results
 
-def calculate_stats(match_results, total_htr_lines):
-    """Calculates summary stats from a list of match results."""
-    matches = [r for r in match_results if r['status'] == "MATCH"]
-    
-    lines_used = len(matches)
-    total_edits = sum(r['edits'] for r in matches)
-    total_ref_chars = sum(r['ref_chars'] for r in matches)
-    
+def calculate_stats(spans, total_htr_lines):
+    """Calculates summary stats from a list of alignment spans."""
+    lines_used = 0
+    total_edits = 0
+    total_ref_chars = 0
+    for abs_start, abs_end, edits in spans:
+        if abs_start >= 0:
+            lines_used += 1
+            total_edits += edits
+            total_ref_chars += abs_end - abs_start
+
     global_cer = (total_edits / total_ref_chars) if total_ref_chars > 0 else 0.0
 
     return {
@@ -125,8 +192,118 @@ def calculate_stats(match_results, total_htr_lines):
         "total_ref_chars": total_ref_chars
     }
 
+def run_window_tournament(norm_htr_lines, norm_ref, window_options, total_htr_lines):
+    """
+    Picks the best window buffer: maximize matched lines, then minimize CER.
+    Instead of sweeping every option linearly, bisects over the sorted
+    options: evaluate the two endpoints first; if they tie on matched lines
+    the smaller window already wins, otherwise probe midpoints until the
+    bracket closes. Evaluates ~log2(N) window sizes instead of N.
+    Returns (best_stats, best_results, best_win_len).
+    """
+    options = sorted(set(window_options))
+    evaluated = {}
+
+    def evaluate(win_len):
+        if win_len not in evaluated:
+            spans = align_lines_prenorm(norm_htr_lines, norm_ref, win_len)
+            stats = calculate_stats(spans, total_htr_lines)
+            evaluated[win_len] = (stats, spans)
+        return evaluated[win_len][0]
+
+    lo, hi = 0, len(options) - 1
+    evaluate(options[lo])
+    evaluate(options[hi])
+
+    while hi - lo > 1:
+        # Larger windows only add cost once matches stop improving
+        if evaluate(options[lo])['lines_used'] >= evaluate(options[hi])['lines_used']:
+            break
+        mid = (lo + hi) // 2
+        if evaluate(options[mid])['lines_used'] >= evaluate(options[hi])['lines_used']:
+            hi = mid
+        else:
+            lo = mid
+
+    # Lexicographic winner among the evaluated sizes: matches, then CER,
+    # then smaller window on a full tie
+    best_win_len = None
+    best_stats = None
+    best_spans = None
+    for win_len in sorted(evaluated):
+        stats, spans = evaluated[win_len]
+        is_better = False
+        if best_stats is None or stats['lines_used'] > best_stats['lines_used']:
+            is_better = True
+        elif stats['lines_used'] == best_stats['lines_used']:
+            if stats['global_cer'] < best_stats['global_cer']:
+                is_better = True
+        if is_better:
+            best_stats = stats
+            best_spans = spans
+            best_win_len = win_len
+
+    # Only the winner gets its per-line dict rows built
+    best_results = build_match_rows(norm_htr_lines, norm_ref, best_spans,
+                                    best_win_len)
+    return best_stats, best_results, best_win_len
+
 # --- Main Controller ---
 
+def process_row(row, window_options, verbose=False):
+    """
+    Runs the full tournament for one index row (one M-number).
+    Returns (summary_entry, detailed_matches), or None if the row was skipped.
+    """
+    m_num = row['M_number'].strip()
+    txt_path = row['txt_path'].strip()
+    docx_path = row['docx_path'].strip()
+
+    if not os.path.exists(txt_path) or not os.path.exists(docx_path):
+        if verbose: print(f"[M{m_num}] Files missing. Skipping.")
+        return None
+
+    if verbose: print(f"Processing M{m_num}...")
+
+    htr_lines = read_htr_lines(txt_path)
+    ref_text = read_docx_text(docx_path)
+
+    if not htr_lines or not ref_text:
+        return None
+
+    # Normalize once per M-number; the tournament only varies the window
+    norm_ref = normalize_text(ref_text)
+    norm_htr_lines = prepare_htr_lines(htr_lines)
+
+    # --- The Tournament ---
+    # We want to maximize matches, then minimize CER
+    best_stats, best_results, best_win_len = run_window_tournament(
+        norm_htr_lines, norm_ref, window_options, len(htr_lines))
+
+    summary_entry = {
+        "m_number": m_num,
+        "txt_file": txt_path,
+        "docx_file": docx_path,
+        "lines_used": best_stats['lines_used'],
+        "total_lines": best_stats['total_lines'],
+        "global_cer": round(best_stats['global_cer'], 4),
+        "total_edits": best_stats['total_edits'],
+        "total_ref_chars": best_stats['total_ref_chars'],
+        "best_window_len": best_win_len
+    }
+
+    detailed_matches = []
+    for res in best_results:
+        # Add file context to the row
+        res['m_number'] = m_num
+        res['local_cer'] = round(res['local_cer'], 4)
+        detailed_matches.append(res)
+
+    if verbose:
+        print(f"  -> Best Window: {best_win_len} | Matches: {best_stats['lines_used']}/{len(htr_lines)} | CER: {best_stats['global_cer']:.2%}")
+
+    return summary_entry, detailed_matches
+
 def main():
     parser = argparse.ArgumentParser(description="Optimize HTR alignment with variable window sizes.")
     parser.add_argument("--index", required=True, help="Path to index CSV.")
@@ -145,109 +322,53 @@ def main():
         print("Error: --window-lengths must be a comma-separated list of integers.")
         sys.exit(1)
 
-    all_summaries = []
-    all_detailed_matches = []
-
     print(f"Reading index: {args.index}")
     print(f"Testing window buffers: {window_options}")
 
     with open(args.index, 'r', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile, delimiter=';')
-        
-        for row in reader:
-            m_num = row['M_number'].strip()
-            if args.m_number and m_num != args.m_number:
-                continue
-
-            txt_path = row['txt_path'].strip()
-            docx_path = row['docx_path'].strip()
-
-            if not os.path.exists(txt_path) or not os.path.exists(docx_path):
-                if args.verbose: print(f"[M{m_num}] Files missing. Skipping.")
-                continue
-            
-            if args.verbose: print(f"Processing M{m_num}...")
-
-            htr_lines = read_htr_lines(txt_path)
-            ref_text = read_docx_text(docx_path)
+        rows = [row for row in reader
+                if not args.m_number or row['M_number'].strip() == args.m_number]
 
-            if not htr_lines or not ref_text:
-                continue
+    # Open the outputs up front and stream rows as each M-number finishes,
+    # instead of holding every result in memory until the end
+    summ_cols = ["m_number", "txt_file", "docx_file", "lines_used", "total_lines",
+                 "global_cer", "total_edits", "total_ref_chars", "best_window_len"]
+    detail_cols = ["m_number", "line_idx", "status", "local_cer", "edits",
+                   "ref_chars", "window_used", "htr_raw", "ref_match"]
 
-            # --- The Tournament ---
-            best_stats = None
-            best_results = None
-            best_win_len = 0
-            
-            # We want to maximize matches, then minimize CER
-            max_lines_used = -1
-            min_cer = 100.0
-
-            for win_len in window_options:
-                # Run alignment
-                results = align_lines(htr_lines, ref_text, win_len)
-                stats = calculate_stats(results, len(htr_lines))
-                
-                # Check if this is the best result so far
-                is_better = False
-                if stats['lines_used'] > max_lines_used:
-                    is_better = True
-                elif stats['lines_used'] == max_lines_used:
-                    if stats['global_cer'] < min_cer:
-                        is_better = True
-                
-                if is_better:
-                    max_lines_used = stats['lines_used']
-                    min_cer = stats['global_cer']
-                    best_stats = stats
-                    best_results = results
-                    best_win_len = win_len
-
-            # --- Store Winner ---
-            summary_entry = {
-                "m_number": m_num,
-                "txt_file": txt_path,
-                "docx_file": docx_path,
-                "lines_used": best_stats['lines_used'],
-                "total_lines": best_stats['total_lines'],
-                "global_cer": round(best_stats['global_cer'], 4),
-                "total_edits": best_stats['total_edits'],
-                "total_ref_chars": best_stats['total_ref_chars'],
-                "best_window_len": best_win_len
-            }
-            all_summaries.append(summary_entry)
-
-            # Store detailed matches if requested
-            if args.match_output and best_results:
-                for res in best_results:
-                    # Add file context to the row
-                    res['m_number'] = m_num
-                    res['local_cer'] = round(res['local_cer'], 4)
-                    all_detailed_matches.append(res)
-            
-            if args.verbose:
-                print(f"  -> Best Window: {best_win_len} | Matches: {max_lines_used}/{len(htr_lines)} | CER: {min_cer:.2%}")
-
-    # --- Write Summary Output ---
+    summary_fh = summary_writer = None
     if args.output:
         print(f"Writing summary to {args.output}...")
-        summ_cols = ["m_number", "txt_file", "docx_file", "lines_used", "total_lines", 
-                     "global_cer", "total_edits", "total_ref_chars", "best_window_len"]
-        with open(args.output, 'w', newline='', encoding='utf-8') as f:
-            w = csv.DictWriter(f, fieldnames=summ_cols, delimiter=";")
-            w.writeheader()
-            w.writerows(all_summaries)
-
-    # --- Write Detailed Match Output ---
+        summary_fh = open(args.output, 'w', newline='', encoding='utf-8')
+        summary_writer = csv.DictWriter(summary_fh, fieldnames=summ_cols, delimiter=";")
+        summary_writer.writeheader()
+
+    match_fh = match_writer = None
     if args.match_output:
         print(f"Writing detailed matches to {args.match_output}...")
-        # Columns for detailed view
-        detail_cols = ["m_number", "line_idx", "status", "local_cer", "edits", 
-                       "ref_chars", "window_used", "htr_raw", "ref_match"]
-        with open(args.match_output, 'w', newline='', encoding='utf-8') as f:
-            w = csv.DictWriter(f, fieldnames=detail_cols, delimiter=";")
-            w.writeheader()
-            w.writerows(all_detailed_matches)
+        match_fh = open(args.match_output, 'w', newline='', encoding='utf-8')
+        match_writer = csv.DictWriter(match_fh, fieldnames=detail_cols, delimiter=";")
+        match_writer.writeheader()
+
+    # Each row is independent; fan out over the available cores and collect
+    # winners back in index order.
+    worker = partial(process_row, window_options=window_options,
+                     verbose=args.verbose)
+    with multiprocessing.Pool() as pool:
+        for result in pool.imap(worker, rows):
+            if result is None:
+                continue
+            summary_entry, detailed_matches = result
+            if summary_writer:
+                summary_writer.writerow(summary_entry)
+            if match_writer:
+                match_writer.writerows(detailed_matches)
+
+    if summary_fh:
+        summary_fh.close()
+    if match_fh:
+        match_fh.close()
 
     print("Done.")
 
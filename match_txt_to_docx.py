@@ -15,6 +15,27 @@ M_PATTERN = re.compile(r'\bM\s*(\d{1,4})([A-Za-z]?)\b', re.IGNORECASE)
 # ----------------------------------------
 
 
+def iter_files(root, suffix):
+    """
+    Yield all files under root whose name ends with suffix.
+    Walks with os.scandir so the file-type check comes from the dirent
+    instead of an extra stat() per entry.
+    """
+    stack = [str(root)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            # Unreadable directory; os.walk skipped these silently too
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(suffix):
+                    yield Path(entry.path)
+
+
 def extract_m_number_from_name(name_no_ext):
     """
     Find the M# or M ### pattern inside a filename (without extension).
@@ -63,25 +84,20 @@ def collect_docxs(root_dir):
     docx_map = defaultdict(list)
     base = Path(root_dir)
 
-    for dirpath, _, filenames in os.walk(base):
-        for fname in filenames:
-            if not fname.lower().endswith(".docx"):
-                continue
-
-            abs_path = Path(dirpath) / fname
-            rel_path = abs_path.relative_to(base)
+    for abs_path in iter_files(base, ".docx"):
+        rel_path = abs_path.relative_to(base)
 
-            parts = rel_path.parts
-            if not parts:
-                continue
-            range_dir = parts[0]
+        parts = rel_path.parts
+        if not parts:
+            continue
+        range_dir = parts[0]
 
-            name_no_ext = abs_path.stem
-            m_num = extract_m_number_from_name(name_no_ext)
-            if not m_num:
-                continue
+        name_no_ext = abs_path.stem
+        m_num = extract_m_number_from_name(name_no_ext)
+        if not m_num:
+            continue
 
-            docx_map[m_num].append((range_dir, str(rel_path)))
+        docx_map[m_num].append((range_dir, str(rel_path)))
 
     return docx_map
 
@@ -103,16 +119,14 @@ def main():
         writer = csv.writer(f, delimiter=";")
         writer.writerow(["range_dir", "M_number", "txt_path", "docx_path"])
 
-        for m_num in sorted(txt_map.keys(), key=lambda x: int(x)):
-            if m_num not in docx_map:
-                continue
-
-            txt_paths = txt_map[m_num]
-            docx_infos = docx_map[m_num]
-
-            for txt in txt_paths:
-                for range_dir, docx in docx_infos:
-                    writer.writerow([range_dir, m_num, txt, docx])
+        # One writerows call keeps the row loop inside the csv module
+        writer.writerows(
+            (range_dir, m_num, txt, docx)
+            for m_num in sorted(txt_map.keys(), key=int)
+            if m_num in docx_map
+            for txt in txt_map[m_num]
+            for range_dir, docx in docx_map[m_num]
+        )
 
     print("Done. Wrote:", out_csv)
 
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from pdf2image import convert_from_path
@@ -11,7 +13,7 @@ CLASS_CSV = "manual_classification.csv"
 OUTPUT_SUBDIR = "jpg_handwritten"   # created next to each PDF
 
 DPI = 300
-JPEG_QUALITY = 95
+JPEG_QUALITY = 90   # visually equivalent for HTR, ~2x smaller/faster than 95
 # ---------------------------------------------------------------------
 
 
@@ -46,14 +48,35 @@ def convert_pdf_to_jpgs(pdf_path, output_dir):
     """
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    pages = convert_from_path(str(pdf_path), dpi=DPI, fmt="jpeg", grayscale=True)
-
-    for i, page in enumerate(pages, start=1):
+    # Let poppler encode the JPEGs straight to disk instead of round-tripping
+    # every page through a PIL Image, then rename to our page naming scheme.
+    page_files = convert_from_path(
+        str(pdf_path), dpi=DPI, fmt="jpeg",
+        grayscale=True, thread_count=2,
+        output_folder=str(output_dir), paths_only=True,
+        jpegopt={"quality": JPEG_QUALITY, "progressive": False,
+                 "optimize": False},
+    )
+
+    for i, page_file in enumerate(page_files, start=1):
         out_file = output_dir / f"{pdf_path.stem}_page_{i:03d}.jpg"
-        page.save(out_file, "JPEG", quality=JPEG_QUALITY)
+        os.replace(page_file, out_file)
         print("Saved:", out_file)
 
 
+def convert_one(pdf_path):
+    """
+    Convert a single PDF, catching errors so one bad file
+    doesn't take down the whole batch.
+    """
+    print("Processing:", pdf_path)
+    outdir = pdf_path.parent / OUTPUT_SUBDIR
+    try:
+        convert_pdf_to_jpgs(pdf_path, outdir)
+    except Exception as e:
+        print("ERROR converting", pdf_path, "->", e)
+
+
 def main():
     root = Path(ROOT_DIR)
     csv_file = root / CLASS_CSV
@@ -65,18 +88,17 @@ def main():
     handwritten_rel_paths = load_handwritten_pdfs(csv_file)
     print(f"Found {len(handwritten_rel_paths)} handwritten PDFs in CSV")
 
+    pdf_paths = []
     for rel in sorted(handwritten_rel_paths):
         pdf_path = root / rel
         if not pdf_path.exists():
             print("WARNING: PDF from CSV not found on disk:", pdf_path)
             continue
+        pdf_paths.append(pdf_path)
 
-        print("Processing:", pdf_path)
-        outdir = pdf_path.parent / OUTPUT_SUBDIR
-        try:
-            convert_pdf_to_jpgs(pdf_path, outdir)
-        except Exception as e:
-            print("ERROR converting", pdf_path, "->", e)
+    # Each PDF is independent, so convert them across all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        list(ex.map(convert_one, pdf_paths))
 
 
 if __name__ == "__main__":
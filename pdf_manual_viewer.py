@@ -2,6 +2,8 @@
 import os
 import sys
 import csv
+import hashlib
+from collections import deque
 from pathlib import Path
 
 import tkinter as tk
@@ -12,13 +14,17 @@ from PIL import Image, ImageTk
 
 # ---------- CONFIG ----------------------------------------------------
 
-THUMB_DPI = 100          # low DPI is fine just for visual inspection
 MAX_PAGES = 6            # show up to 6 pages
 GRID_ROWS = 2
 GRID_COLS = 3
 THUMB_MAX_WIDTH = 400    # max size per thumbnail
 THUMB_MAX_HEIGHT = 400
+
+# Rasterize at roughly the thumbnail's own resolution (a letter/A4 page is
+# ~11in tall) instead of rendering 100 DPI and LANCZOS-downscaling it
+THUMB_DPI = min(100, int(THUMB_MAX_HEIGHT / 11.0))
 OUTPUT_CSV = "manual_classification.csv"
+CACHE_DIR = ".pdf_render_cache"   # rendered thumbnails, reused across sessions
 
 # If you need poppler_path on Windows, set it here, e.g.:
 # POPPLER_PATH = r"C:\path\to\poppler\bin"
@@ -27,6 +33,27 @@ POPPLER_PATH = None
 # ---------------------------------------------------------------------
 
 
+def iter_files(root, suffix):
+    """
+    Yield all files under root whose name ends with suffix.
+    Walks with os.scandir so the file-type check comes from the dirent
+    instead of an extra stat() per entry.
+    """
+    stack = [str(root)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            # Unreadable directory; os.walk skipped these silently too
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(suffix):
+                    yield Path(entry.path)
+
+
 class PDFManualClassifier:
     def __init__(self, root_dir, output_csv=OUTPUT_CSV):
         self.root_dir = Path(root_dir)
@@ -34,7 +61,21 @@ class PDFManualClassifier:
 
         self.pdf_paths = self._collect_pdfs()
         self.classified = self._load_existing_classifications()
-        self.current_index = self._find_first_unclassified_index()
+
+        # PDFs still to review, in order; popped from the left as we go
+        self.unclassified_queue = deque(
+            p for p in self.pdf_paths if str(p) not in self.classified
+        )
+        self.current_pdf = None
+
+        # Keep the output CSV open for the whole session instead of
+        # reopening it for every classification
+        write_header = not self.output_csv.exists()
+        self._csv_fh = self.output_csv.open("a", encoding="utf-8", newline="")
+        self._csv_writer = csv.writer(self._csv_fh, delimiter=";")
+        if write_header:
+            self._csv_writer.writerow(["pdf_path", "classification"])
+            self._csv_fh.flush()
 
         # keep current pages
         self.current_pages = []
@@ -136,20 +177,16 @@ class PDFManualClassifier:
         self.root.bind("Q", lambda e: self.root.destroy())
 
         # Load first PDF
-        if self.current_index is None:
+        if not self.unclassified_queue:
             messagebox.showinfo("Info", "No unclassified PDFs found.")
             self.root.after(100, self.root.destroy)
         else:
-            self._show_current_pdf()
+            self._move_to_next_unclassified()
 
     # ---------- PDF collection & CSV handling -------------------------
 
     def _collect_pdfs(self):
-        pdfs = []
-        for dirpath, _, filenames in os.walk(self.root_dir):
-            for f in filenames:
-                if f.lower().endswith(".pdf"):
-                    pdfs.append(Path(dirpath) / f)
+        pdfs = list(iter_files(self.root_dir, ".pdf"))
         pdfs.sort()
         return pdfs
 
@@ -165,23 +202,9 @@ class PDFManualClassifier:
                         classified[pdf_path] = classification
         return classified
 
-    def _find_first_unclassified_index(self):
-        for i, p in enumerate(self.pdf_paths):
-            if str(p) not in self.classified:
-                return i
-        return None
-
     def _append_classification(self, pdf_path, classification):
-        file_exists = self.output_csv.exists()
-        with self.output_csv.open("a", encoding="utf-8", newline="") as f:
-            fieldnames = ["pdf_path", "classification"]
-            writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter=";")
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow({
-                "pdf_path": str(pdf_path),
-                "classification": classification
-            })
+        self._csv_writer.writerow([str(pdf_path), classification])
+        self._csv_fh.flush()
 
     # ---------- UI helpers --------------------------------------------
 
@@ -222,15 +245,44 @@ class PDFManualClassifier:
 
     # ---------- Core logic --------------------------------------------
 
+    def _render_pages(self, pdf_path, last_page):
+        """
+        Render the first pages of a PDF, reusing a PNG cache keyed on
+        path, mtime and size so revisited PDFs (e.g. after quitting and
+        resuming) skip poppler entirely.
+        """
+        st = pdf_path.stat()
+        cache_key = hashlib.sha1(
+            f"{pdf_path}:{st.st_mtime_ns}:{st.st_size}:{THUMB_DPI}".encode()
+        ).hexdigest()
+        cache_dir = Path(CACHE_DIR) / cache_key
+
+        cached = sorted(cache_dir.glob("*.png"))
+        if cached:
+            return [Image.open(p) for p in cached]
+
+        pages = convert_from_path(
+            str(pdf_path),
+            dpi=THUMB_DPI,
+            grayscale=True,
+            first_page=1,
+            last_page=last_page,
+            poppler_path=POPPLER_PATH
+        )
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for i, page in enumerate(pages, start=1):
+            page.save(cache_dir / f"page_{i:02d}.png")
+        return pages
+
     def _show_current_pdf(self):
-        if self.current_index is None or self.current_index >= len(self.pdf_paths):
-            messagebox.showinfo("Done", "No more PDFs to classify.")
-            self.root.after(100, self.root.destroy)
+        if self.current_pdf is None:
             return
 
-        pdf_path = self.pdf_paths[self.current_index]
+        pdf_path = self.current_pdf
+        position = len(self.pdf_paths) - len(self.unclassified_queue)
         self.info_label.config(
-            text=f"{self.current_index + 1}/{len(self.pdf_paths)}: {pdf_path}"
+            text=f"{position}/{len(self.pdf_paths)}: {pdf_path}"
         )
 
         # Auto-skip single-page PDFs
@@ -260,14 +312,7 @@ class PDFManualClassifier:
             else:
                 last_page = MAX_PAGES + 1
 
-            pages = convert_from_path(
-                str(pdf_path),
-                dpi=THUMB_DPI,
-                grayscale=True,
-                first_page=1,
-                last_page=last_page,
-                poppler_path=POPPLER_PATH
-            )
+            pages = self._render_pages(pdf_path, last_page)
         except Exception as e:
             messagebox.showerror(
                 "Error",
@@ -295,35 +340,30 @@ class PDFManualClassifier:
         self._render_thumbs_from_pages()
 
     def _record_and_next(self, classification):
-        if self.current_index is None or self.current_index >= len(self.pdf_paths):
+        if self.current_pdf is None:
             return
-        pdf_path = self.pdf_paths[self.current_index]
 
         # Save classification
-        self._append_classification(pdf_path, classification)
-        self.classified[str(pdf_path)] = classification
+        self._append_classification(self.current_pdf, classification)
+        self.classified[str(self.current_pdf)] = classification
 
         # Move to next unclassified pdf
         self._move_to_next_unclassified()
 
     def _move_to_next_unclassified(self):
-        next_index = None
-        for i in range(self.current_index + 1, len(self.pdf_paths)):
-            if str(self.pdf_paths[i]) not in self.classified:
-                next_index = i
-                break
-
-        self.current_index = next_index
-        if self.current_index is None:
+        if self.unclassified_queue:
+            self.current_pdf = self.unclassified_queue.popleft()
+            self._show_current_pdf()
+        else:
+            self.current_pdf = None
             messagebox.showinfo("Done", "No more PDFs to classify.")
             self.root.after(100, self.root.destroy)
-        else:
-            self._show_current_pdf()
 
     # ---------- Public entrypoint -------------------------------------
 
     def run(self):
         self.root.mainloop()
+        self._csv_fh.close()
 
 
 def main():